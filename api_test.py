@@ -87,8 +87,7 @@ models, hyperparameter tuning, and multimodal experiments. (weeks
 baselines. (weeks 17-18)
 • Report writing, refinement, preparation for presentation. (weeks 19-20)
 Report writing will also be done in parallel to the detailed tasks throughout
-most of the weeks. Frequent meetings with supervisor throughout.""",
-    "parallel": False
+most of the weeks. Frequent meetings with supervisor throughout."""
 }
 
 response = requests.post("http://localhost:8000/analyze", json=payload, timeout=300)
@@ -114,6 +113,8 @@ print(data)
 #     "mitigation_suggestions": List[str]
 #   },
 #   "literature_scout": {
+#     "inferred_topics": List[str],
+#     "search_queries": List[str],
 #     "example_related_work": List[str]
 #   }
 # }
\ No newline at end of file
@@ -0,0 +1,247 @@
+"""Semantic response cache placed in front of the agents' Gemini calls."""
+
+import asyncio
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Awaitable, Callable, Optional
+
+import orjson
+
+if TYPE_CHECKING:
+    # Imported where needed instead: NumPy is only used for similarity
+    # lookups and persistence, and is slow to import
+    import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Suggested similarity threshold: near-identical texts (whitespace, typos,
+# small edits) reuse responses while genuinely different ones do not
+DEFAULT_THRESHOLD = 0.97
+
+# Maps a text to its embedding vector
+Embedder = Callable[[str], Awaitable["np.ndarray"]]
+
+
+class _Namespace:
+    """Cached responses of one agent, with an embedding matrix for lookups."""
+
+    def __init__(self):
+        self.exact: "OrderedDict[bytes, tuple[str, float]]" = OrderedDict()
+        self.keys: list[bytes] = []
+        self.matrix: "Optional[np.ndarray]" = None
+
+
+class SemanticCache:
+    """
+    Cache agent responses by exact input and, optionally, by similarity.
+
+    Inputs are first looked up by their SHA-256 digest. If a similarity
+    threshold is set, a miss falls back to comparing the input's embedding
+    with those of cached inputs and reuses the response of the closest one
+    when their cosine similarity reaches the threshold.
+    """
+
+    def __init__(
+        self,
+        embed: Optional[Embedder] = None,
+        threshold: Optional[float] = None,
+        ttl_secs: int = 3600,
+        max_entries: int = 1024,
+    ):
+        """
+        Initialize the cache.
+
+        Args:
+            embed: Coroutine function returning an embedding for a text
+            threshold: Minimum cosine similarity for a semantic hit. If None,
+                only exact matches are served and nothing is embedded
+            ttl_secs: Lifetime of a cached response in seconds
+            max_entries: Maximum number of responses kept per namespace
+        """
+        if threshold is not None and embed is None:
+            raise ValueError("A semantic threshold requires an embed function")
+        self.embed = embed
+        self.threshold = threshold
+        self.ttl_secs = ttl_secs
+        self.max_entries = max_entries
+        self._namespaces: dict[str, _Namespace] = {}
+        # Embeddings (or in-flight embedding tasks) by input digest, shared by
+        # every namespace so agents receiving the same input embed it once
+        self._embeddings: "OrderedDict[bytes, asyncio.Future]" = OrderedDict()
+
+    async def get(self, namespace: str, text: str) -> Optional[str]:
+        """
+        Look up a cached response.
+
+        Args:
+            namespace: Name of the agent the response belongs to
+            text: The agent input
+
+        Returns:
+            The cached response, or None on a miss
+        """
+        ns = self._namespaces.get(namespace)
+        if ns is None:
+            return None
+
+        key = _digest(text)
+        entry = ns.exact.get(key)
+        if entry is not None:
+            response, expires_at = entry
+            if time.monotonic() < expires_at:
+                return response
+            self._evict(ns, key)
+
+        if self.threshold is None or ns.matrix is None:
+            return None
+
+        try:
+            embedding = await self._embedding(key, text)
+        except Exception as e:
+            logger.warning("Embedding failed, skipping semantic lookup: %s", e)
+            return None
+        similarities = ns.matrix @ embedding
+        best = int(similarities.argmax())
+        if similarities[best] < self.threshold:
+            return None
+        response, expires_at = ns.exact[ns.keys[best]]
+        if time.monotonic() >= expires_at:
+            self._evict(ns, ns.keys[best])
+            return None
+        return response
+
+    async def put(self, namespace: str, text: str, response: str) -> None:
+        """
+        Store a response.
+
+        Args:
+            namespace: Name of the agent the response belongs to
+            text: The agent input
+            response: The agent response for that input
+        """
+        ns = self._namespaces.setdefault(namespace, _Namespace())
+        key = _digest(text)
+        if key in ns.exact:
+            self._evict(ns, key)
+        while len(ns.exact) >= self.max_entries:
+            self._evict(ns, next(iter(ns.exact)))
+
+        ns.exact[key] = (response, time.monotonic() + self.ttl_secs)
+        if self.threshold is not None:
+            try:
+                embedding = await self._embedding(key, text)
+            except Exception as e:
+                logger.warning("Embedding failed, caching exact match only: %s", e)
+                return
+            if key not in ns.exact:
+                return  # Evicted while the embedding was computed
+            if key in ns.keys:
+                return  # Added by a concurrent put() of the same text
+            import numpy as np
+
+            ns.keys.append(key)
+            row = embedding[np.newaxis, :]
+            ns.matrix = row if ns.matrix is None else np.vstack([ns.matrix, row])
+
+    def save(self, path: str) -> None:
+        """
+        Write the unexpired responses and their embeddings to path.
+
+        The file is a NumPy .npz archive, loadable without pickle.
+        """
+        import numpy as np
+
+        now = time.monotonic()
+        wall_offset = time.time() - now
+        meta = {}
+        arrays = {}
+        for i, (name, ns) in enumerate(self._namespaces.items()):
+            meta[name] = {
+                "entries": [
+                    (key.hex(), response, expires_at + wall_offset)
+                    for key, (response, expires_at) in ns.exact.items()
+                    if expires_at > now
+                ],
+                "keys": [key.hex() for key in ns.keys],
+                "matrix": f"matrix_{i}" if ns.matrix is not None else None,
+            }
+            if ns.matrix is not None:
+                arrays[f"matrix_{i}"] = ns.matrix
+        with open(path, "wb") as f:
+            np.savez(f, meta=np.frombuffer(orjson.dumps(meta), dtype=np.uint8), **arrays)
+
+    def load(self, path: str) -> None:
+        """Add the responses saved by save() to the cache, skipping expired ones."""
+        import numpy as np
+
+        now = time.monotonic()
+        wall_offset = time.time() - now
+        with np.load(path) as data:
+            meta = orjson.loads(data["meta"].tobytes())
+            for name, saved in meta.items():
+                ns = self._namespaces.setdefault(name, _Namespace())
+                for key, response, expires_at in saved["entries"]:
+                    if expires_at - wall_offset > now:
+                        ns.exact[bytes.fromhex(key)] = (
+                            response, expires_at - wall_offset
+                        )
+                if saved["matrix"] is None or self.threshold is None:
+                    continue
+                matrix = data[saved["matrix"]]
+                rows = [
+                    row
+                    for row, key in enumerate(map(bytes.fromhex, saved["keys"]))
+                    if key in ns.exact and key not in ns.keys
+                ]
+                ns.keys.extend(bytes.fromhex(saved["keys"][row]) for row in rows)
+                loaded = matrix[rows]
+                ns.matrix = (
+                    loaded if ns.matrix is None else np.vstack([ns.matrix, loaded])
+                )
+                if not ns.keys:
+                    ns.matrix = None
+            for ns in self._namespaces.values():
+                while len(ns.exact) > self.max_entries:
+                    self._evict(ns, next(iter(ns.exact)))
+
+    def clear(self) -> None:
+        """Drop every cached response and embedding."""
+        self._namespaces.clear()
+        self._embeddings.clear()
+
+    def _evict(self, ns: _Namespace, key: bytes) -> None:
+        del ns.exact[key]
+        if ns.matrix is not None and key in ns.keys:
+            import numpy as np
+
+            row = ns.keys.index(key)
+            del ns.keys[row]
+            ns.matrix = np.delete(ns.matrix, row, axis=0) if ns.keys else None
+
+    async def _embedding(self, key: bytes, text: str) -> "np.ndarray":
+        """Return the L2-normalized embedding of text, computing it at most once."""
+        future = self._embeddings.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._normalized_embedding(text))
+            self._embeddings[key] = future
+            if len(self._embeddings) > self.max_entries:
+                self._embeddings.popitem(last=False)
+        else:
+            self._embeddings.move_to_end(key)
+        try:
+            return await asyncio.shield(future)
+        except Exception:
+            self._embeddings.pop(key, None)
+            raise
+
+    async def _normalized_embedding(self, text: str) -> "np.ndarray":
+        import numpy as np
+
+        vector = np.asarray(await self.embed(text), dtype=np.float32)
+        return vector / (np.linalg.norm(vector) or 1.0)
+
+
+def _digest(text: str) -> bytes:
+    return hashlib.sha256(text.encode()).digest()
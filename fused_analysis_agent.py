@@ -0,0 +1,76 @@
+"""Fused Analysis Agent running the whole analysis in a single call."""
+
+from typing import Optional
+
+from google import genai
+
+from cache import SemanticCache
+from gemini_agent import GeminiAgent, RateLimiter
+from llm_cache import LLMCache
+from literature_scout_agent import FULL_SYS_INSTRUCTIONS as LITERATURE_INSTRUCTIONS
+from research_structure_agent import SYS_INSTRUCTIONS as RESEARCH_INSTRUCTIONS
+from schemas import AnalysisOutput
+from validity_threat_agent import SYS_INSTRUCTIONS as VALIDITY_INSTRUCTIONS
+
+# Upper bound on generated tokens (including thinking) per response, the sum
+# of the three separate agents' limits
+MAX_OUTPUT_TOKENS = 8192
+
+# Thinking disabled, as in the three separate agents
+THINKING_BUDGET = 0
+
+SYS_INSTRUCTIONS = f"""The user message contains a research text. Fill in every part of the response by following the three sets of instructions below in order. Wherever the second and third refer to the Ongoing Research Structured Summary, use the research structure you extracted in the first part.
+
+=== Part 1: research_structure ===
+
+{RESEARCH_INSTRUCTIONS}
+=== Part 2: validity_threats ===
+
+{VALIDITY_INSTRUCTIONS}
+=== Part 3: literature_scout ===
+
+{LITERATURE_INSTRUCTIONS}"""
+
+
+class FusedAnalysisAgent(GeminiAgent):
+    """
+    Agent producing the research structure, validity threats and literature
+    pointers together, so the research text is sent and prefilled only once.
+    """
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        model: str = "gemini-2.5-flash",
+        client: Optional[genai.Client] = None,
+        response_cache: Optional[SemanticCache] = None,
+        disk_cache: Optional[LLMCache] = None,
+        rate_limiter: Optional[RateLimiter] = None,
+        thinking_budget: Optional[int] = THINKING_BUDGET,
+    ):
+        """
+        Initialize the Fused Analysis Agent.
+
+        Args:
+            api_key: Google API key for Gemini
+            model: Gemini model to use
+            client: Gemini client to use. If None, agents share one client
+                per API key and event loop
+            response_cache: Cache of previous responses to serve repeats from
+            disk_cache: Persistent cache of previous responses
+            rate_limiter: Limiter shared with the other agents
+            thinking_budget: Cap on thinking tokens, or None for the model's
+                default
+        """
+        super().__init__(
+            SYS_INSTRUCTIONS,
+            AnalysisOutput,
+            api_key,
+            model,
+            client,
+            max_output_tokens=MAX_OUTPUT_TOKENS,
+            thinking_budget=thinking_budget,
+            response_cache=response_cache,
+            disk_cache=disk_cache,
+            rate_limiter=rate_limiter,
+        )
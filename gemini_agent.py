@@ -0,0 +1,943 @@
+"""Shared Gemini plumbing for the research analysis agents."""
+
+import asyncio
+import hashlib
+import logging
+import random
+import time
+import weakref
+from collections import OrderedDict
+from typing import AsyncIterator, Optional
+
+import httpx
+import orjson
+from google import genai
+from google.genai import errors, types
+from pydantic import BaseModel, ValidationError
+
+from cache import SemanticCache
+from llm_cache import LLMCache
+
+logger = logging.getLogger(__name__)
+
+# Refresh the cached system instruction this many seconds before it expires
+CACHE_REFRESH_MARGIN = 300
+
+# Smallest prompt, in tokens, that each model accepts as cached content.
+# None of the current system instructions reaches it (the longest, the
+# fused prompt, is about 1000 tokens), so they are all sent inline
+MIN_CACHE_TOKENS = {
+    "gemini-2.5-flash": 1024,
+    "gemini-2.5-flash-lite": 1024,
+    "gemini-2.5-pro": 4096,
+}
+
+# Minimum assumed for models not listed in MIN_CACHE_TOKENS
+DEFAULT_MIN_CACHE_TOKENS = 4096
+
+# Most tokens a Gemini 2.5 model generates in one response
+MODEL_OUTPUT_TOKEN_LIMIT = 65_536
+
+# Per-request timeout for Gemini calls, in milliseconds
+REQUEST_TIMEOUT_MS = 300_000
+
+# Number of recent inputs whose token count is remembered
+TOKEN_COUNT_CACHE_SIZE = 128
+
+# Retries of a call failing with a rate limit, server error or timeout
+MAX_RETRIES = 4
+
+# Upper bound, in seconds, of the randomized delay before the first retry;
+# it doubles with every further retry up to RETRY_MAX_DELAY
+RETRY_BASE_DELAY = 1.0
+RETRY_MAX_DELAY = 30.0
+
+# Placeholder the prompts ask for when a text field is absent from the input
+NOT_SPECIFIED = "Not specified"
+
+
+def create_http_client() -> httpx.AsyncClient:
+    """
+    Create the HTTP/2 connection pool used by create_client().
+
+    Concurrent agent calls are multiplexed over a kept-alive connection
+    instead of each paying for its own TCP and TLS handshake.
+    """
+    return httpx.AsyncClient(
+        http2=True,
+        limits=httpx.Limits(max_keepalive_connections=32, keepalive_expiry=60),
+    )
+
+
+def create_client(
+    api_key: Optional[str] = None, http_client: Optional[httpx.AsyncClient] = None
+) -> genai.Client:
+    """
+    Create a Gemini client whose async calls share one HTTP/2 connection pool.
+
+    Args:
+        api_key: Google API key for Gemini
+        http_client: Pool from create_http_client(). The SDK never closes it,
+            so callers that close the client should pass their own and close
+            it with close_client(). If None, a new pool is created
+
+    Returns:
+        A configured Gemini client
+    """
+    if http_client is None:
+        http_client = create_http_client()
+    return genai.Client(
+        api_key=api_key,
+        http_options=types.HttpOptions(
+            timeout=REQUEST_TIMEOUT_MS,
+            httpx_async_client=http_client,
+        ),
+    )
+
+
+# Clients shared by agents constructed without one, by event loop and API key.
+# A connection pool only works on the loop that opened its connections.
+_CLIENT_CACHE: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def shared_client(api_key: Optional[str] = None) -> genai.Client:
+    """
+    Return the client for api_key on the running event loop, creating it on
+    first use.
+
+    Agents built separately with the same key then share one connection
+    pool instead of each opening their own, and a script calling
+    asyncio.run() repeatedly gets a fresh pool for every loop.
+
+    Args:
+        api_key: Google API key for Gemini
+
+    Returns:
+        The shared Gemini client
+
+    Raises:
+        RuntimeError: If no event loop is running
+    """
+    clients = _CLIENT_CACHE.setdefault(asyncio.get_running_loop(), {})
+    client = clients.get(api_key)
+    if client is None:
+        client = clients[api_key] = create_client(api_key)
+    return client
+
+
+def user_content(text: str) -> types.Content:
+    """
+    Wrap text as a user turn.
+
+    Passing a ready-made Content lets the SDK forward it as-is instead of
+    inferring and validating a Content from a bare string on every call.
+    """
+    return types.Content(role="user", parts=[types.Part(text=text)])
+
+
+async def close_client(client: genai.Client, http_client: httpx.AsyncClient) -> None:
+    """
+    Close a client created by create_client() and the HTTP pool passed to it.
+
+    The SDK leaves user-supplied httpx clients open, so the pool is closed
+    here explicitly.
+    """
+    await client.aio.aclose()
+    await http_client.aclose()
+
+
+class RateLimiter:
+    """
+    Token bucket spacing out Gemini requests to stay within a quota.
+
+    Requests beyond the burst capacity wait, in arrival order, until the
+    bucket refills, instead of being rejected by the API with a 429.
+    """
+
+    def __init__(self, requests_per_minute: float, burst: Optional[int] = None):
+        """
+        Initialize the limiter.
+
+        Args:
+            requests_per_minute: Sustained request rate
+            burst: Requests allowed back-to-back after a quiet period.
+                Defaults to one second's worth of requests
+        """
+        if requests_per_minute <= 0:
+            raise ValueError("requests_per_minute must be positive")
+        self.rate = requests_per_minute / 60
+        self.capacity = float(burst if burst is not None else max(1, round(self.rate)))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        """Wait until a request may be sent."""
+        async with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.capacity, self._tokens + (now - self._updated) * self.rate
+            )
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+            self._tokens = 0.0
+            self._updated = time.monotonic()
+
+
+class GeminiAgent:
+    """
+    Base class for agents that send a fixed system instruction to Gemini.
+
+    Responses are constrained to JSON matching the agent's response schema.
+    The system instruction is uploaded once as cached content and referenced
+    by name on every call, so it is not re-sent and re-processed per request.
+    Instructions below the cacheable minimum, or whose cache cannot be
+    created, are sent inline instead.
+    """
+
+    def __init__(
+        self,
+        sys_instructions: str,
+        response_schema: type[BaseModel],
+        api_key: Optional[str] = None,
+        model: str = "gemini-2.5-flash",
+        client: Optional[genai.Client] = None,
+        cache_ttl: int = 3600,
+        max_output_tokens: Optional[int] = None,
+        response_cache: Optional[SemanticCache] = None,
+        disk_cache: Optional[LLMCache] = None,
+        rate_limiter: Optional[RateLimiter] = None,
+        thinking_budget: Optional[int] = None,
+    ):
+        """
+        Initialize the agent.
+
+        Args:
+            sys_instructions: Static system instruction for every call
+            response_schema: Pydantic model the JSON response must follow
+            api_key: Google API key for Gemini
+            model: Gemini model to use
+            client: Gemini client to use. If None, agents share one client
+                per API key and event loop
+            cache_ttl: Lifetime of the cached system instruction in seconds
+            max_output_tokens: Cap on generated tokens, bounding response latency
+            response_cache: Cache consulted before, and filled after, each call
+            disk_cache: Persistent cache consulted after response_cache
+            rate_limiter: Limiter every Gemini request waits on, typically
+                shared by all agents using the same quota
+            thinking_budget: Cap on thinking tokens; 0 disables thinking on
+                models that allow it. If None, the model's default applies.
+                A budget the model rejects is dropped after the first call
+        """
+        self._client = client
+        self._api_key = api_key
+        self.model = model
+        self.cache_ttl = cache_ttl
+        self._sys_instructions = sys_instructions
+        self.response_schema = response_schema
+        # Pass the schema as plain JSON Schema, built once. Given the Pydantic
+        # class, the SDK would re-convert it and validate every response into
+        # a model instance that the orchestrator never uses.
+        self._response_json_schema = response_schema.model_json_schema()
+        # Answer to blank inputs, which are not sent to Gemini
+        self._empty_response = orjson.dumps(
+            _empty_json(
+                self._response_json_schema,
+                self._response_json_schema.get("$defs", {}),
+            )
+        ).decode()
+        self.max_output_tokens = max_output_tokens
+        self.thinking_budget = thinking_budget
+        self.response_cache = response_cache
+        # Responses are only interchangeable between calls to the same model
+        self.cache_namespace = f"{type(self).__name__}@{model}"
+        self.disk_cache = disk_cache
+        self.rate_limiter = rate_limiter
+        self._disk_key_prefix = self._make_disk_key_prefix()
+        self._cache_name: Optional[str] = None
+        self._cache_expires_at = 0.0
+        self._cache_retry_at = 0.0
+        self._min_cache_tokens = MIN_CACHE_TOKENS.get(model, DEFAULT_MIN_CACHE_TOKENS)
+        # A token spans at least one character, so a shorter instruction is
+        # known to be too short without a count_tokens request
+        self._cacheable: Optional[bool] = (
+            False if len(sys_instructions) < self._min_cache_tokens else None
+        )
+        self._cache_lock = asyncio.Lock()
+        self._refresh_task: Optional[asyncio.Task] = None
+        # Token counts of recent inputs, keyed by a digest of the text
+        self._token_counts: "OrderedDict[bytes, int]" = OrderedDict()
+        # Generation configs by batch size, valid for _configs_cache_name
+        self._configs: dict[int, types.GenerateContentConfig] = {}
+        self._configs_cache_name: Optional[str] = None
+
+    @property
+    def client(self) -> genai.Client:
+        """The client given to the constructor, or the shared one for api_key."""
+        if self._client is not None:
+            return self._client
+        return shared_client(self._api_key)
+
+    @client.setter
+    def client(self, client: genai.Client) -> None:
+        self._client = client
+
+    async def get_response(self, research_text: str) -> str:
+        """
+        Generate a response from the LLM.
+
+        A blank input gets an empty response (empty lists, text fields
+        NOT_SPECIFIED) without calling Gemini.
+
+        Args:
+            research_text (str): The input.
+
+        Returns:
+            str: Generated response from the LLM.
+        """
+        if not research_text.strip():
+            return self._empty_response
+        cached = await self._cached_response(research_text)
+        if cached is not None:
+            return cached
+
+        response = await self._generate_content(user_content(research_text))
+
+        if response.text and _finish_reason(response) == types.FinishReason.STOP:
+            await self._store_response(research_text, response.text)
+        return response.text
+
+    async def get_response_parsed(self, research_text: str) -> BaseModel:
+        """
+        Generate a response and parse it into the agent's response schema.
+
+        The JSON is decoded and validated in a single pass by pydantic-core.
+
+        Args:
+            research_text (str): The input.
+
+        Returns:
+            BaseModel: Instance of the agent's response schema.
+        """
+        response = await self.get_response(research_text)
+        return self.response_schema.model_validate_json(response or "null")
+
+    async def stream_response(self, research_text: str) -> AsyncIterator[str]:
+        """
+        Generate a response from the LLM, yielding text chunks as they arrive.
+
+        A cached response is yielded as a single chunk.
+
+        Args:
+            research_text (str): The input.
+
+        Yields:
+            str: Consecutive pieces of the generated response.
+        """
+        if not research_text.strip():
+            yield self._empty_response
+            return
+        cached = await self._cached_response(research_text)
+        if cached is not None:
+            yield cached
+            return
+
+        parts = []
+        finish_reason = None
+        attempt = 0
+        cache_retried = False
+        while True:
+            config = await self._generate_config()
+            try:
+                if self.rate_limiter is not None:
+                    await self.rate_limiter.acquire()
+                stream = await self.client.aio.models.generate_content_stream(
+                    model=self.model,
+                    contents=user_content(research_text),
+                    config=config,
+                )
+                async for chunk in stream:
+                    finish_reason = _finish_reason(chunk) or finish_reason
+                    if chunk.text:
+                        parts.append(chunk.text)
+                        yield chunk.text
+                break
+            except (errors.APIError, httpx.TimeoutException) as e:
+                # Only a stream that failed before yielding anything can restart
+                if parts:
+                    raise
+                if not cache_retried and self._drop_lost_cache(config, e):
+                    cache_retried = True
+                    continue
+                if self._drop_thinking_budget(config, e):
+                    continue
+                await self._backoff(attempt, e)
+                attempt += 1
+
+        if parts and finish_reason == types.FinishReason.STOP:
+            await self._store_response(research_text, "".join(parts))
+
+    async def get_responses(
+        self, research_texts: list[str], max_concurrency: int = 10
+    ) -> list[str]:
+        """
+        Generate responses for several inputs with concurrent LLM calls.
+
+        Unlike get_response_batch(), each input gets its own call, so one
+        bad input cannot spoil the others. At most max_concurrency calls
+        are in flight at once, and repeated inputs are only sent once.
+
+        Args:
+            research_texts (list[str]): The inputs.
+            max_concurrency (int): Maximum number of simultaneous calls.
+
+        Returns:
+            list[str]: One response per input, in input order.
+        """
+        unique = list(dict.fromkeys(research_texts))
+        if len(unique) < len(research_texts):
+            unique_responses = await self.get_responses(unique, max_concurrency)
+            by_text = dict(zip(unique, unique_responses))
+            return [by_text[research_text] for research_text in research_texts]
+
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def bounded(research_text: str) -> str:
+            async with semaphore:
+                return await self.get_response(research_text)
+
+        return list(await asyncio.gather(*map(bounded, research_texts)))
+
+    async def get_response_long(
+        self, research_text: str, chunk_tokens: int = 8000
+    ) -> tuple[str, bool]:
+        """
+        Generate a response for a long input by analyzing it in chunks.
+
+        An input above chunk_tokens is split on paragraph boundaries into
+        chunks of about chunk_tokens, which are analyzed concurrently. The
+        per-chunk JSON responses are then merged: lists are concatenated
+        without duplicates and text fields take the first specified value.
+        Chunks whose response is not valid JSON are left out of the merge.
+        Shorter inputs take the regular get_response() path.
+
+        Args:
+            research_text (str): The input.
+            chunk_tokens (int): Target size of each chunk, in tokens.
+
+        Returns:
+            tuple[str, bool]: The merged JSON response, and whether every
+                chunk contributed to it. Partial responses are not cached.
+        """
+        cached = await self._cached_response(research_text)
+        if cached is not None:
+            return cached, True
+
+        total_tokens = await self.count_tokens(research_text)
+        if total_tokens <= chunk_tokens:
+            return await self.get_response(research_text), True
+
+        chunk_chars = max(1, len(research_text) * chunk_tokens // total_tokens)
+        chunks = _split_paragraphs(research_text, chunk_chars)
+        responses = await self.get_responses(chunks)
+
+        merged = None
+        failed = 0
+        for n, response in enumerate(responses, 1):
+            try:
+                merged = _merge_json(merged, orjson.loads(response or ""))
+            except orjson.JSONDecodeError as e:
+                failed += 1
+                logger.warning(
+                    "Skipping chunk %d/%d of %s response: %s",
+                    n,
+                    len(responses),
+                    type(self).__name__,
+                    e,
+                )
+        if failed == len(responses):
+            # Left for the caller to report as unparseable
+            return responses[0] or "", False
+
+        response = orjson.dumps(merged).decode()
+        if not failed:
+            await self._store_response(research_text, response)
+        return response, not failed
+
+    async def count_tokens(self, research_text: str) -> int:
+        """
+        Count the tokens research_text takes as input to the agent's model.
+
+        Counts of recent inputs are remembered, so checking an input and
+        then chunking it costs a single count_tokens request. Failures are
+        retried like generate_content calls (see _backoff).
+        """
+        key = hashlib.sha256(research_text.encode()).digest()
+        total_tokens = self._token_counts.get(key)
+        if total_tokens is None:
+            attempt = 0
+            while True:
+                try:
+                    count = await self.client.aio.models.count_tokens(
+                        model=self.model, contents=research_text
+                    )
+                    break
+                except (errors.APIError, httpx.TimeoutException) as e:
+                    await self._backoff(attempt, e)
+                    attempt += 1
+            total_tokens = count.total_tokens or 0
+            self._token_counts[key] = total_tokens
+            if len(self._token_counts) > TOKEN_COUNT_CACHE_SIZE:
+                self._token_counts.popitem(last=False)
+        else:
+            self._token_counts.move_to_end(key)
+        return total_tokens
+
+    async def get_response_batch(self, research_texts: list[str]) -> list[str]:
+        """
+        Generate responses for several inputs with a single LLM call.
+
+        Inputs with a cached response are not sent, and repeated inputs are
+        sent once. The rest are numbered in one prompt and the model returns
+        a JSON array with one element per input, which amortizes the
+        round-trip and system-instruction prefill. If their combined output
+        cap exceeds MODEL_OUTPUT_TOKEN_LIMIT, the inputs are split over
+        several concurrent calls.
+
+        Args:
+            research_texts (list[str]): The inputs.
+
+        Returns:
+            list[str]: One JSON response per input, in input order.
+
+        Raises:
+            ValueError: If the model does not return one element per input
+        """
+        unique = list(dict.fromkeys(research_texts))
+        if len(unique) < len(research_texts):
+            by_text = dict(zip(unique, await self.get_response_batch(unique)))
+            return [by_text[research_text] for research_text in research_texts]
+
+        responses: list[Optional[str]] = [
+            await self._cached_response(research_text)
+            if research_text.strip()
+            else self._empty_response
+            for research_text in research_texts
+        ]
+        missing = [i for i, response in enumerate(responses) if response is None]
+
+        if not missing:
+            return responses
+        batch_size = len(missing)
+        if self.max_output_tokens is not None:
+            batch_size = max(1, MODEL_OUTPUT_TOKEN_LIMIT // self.max_output_tokens)
+        parts = [
+            missing[start : start + batch_size]
+            for start in range(0, len(missing), batch_size)
+        ]
+        outputs = await asyncio.gather(
+            *(self._generate_batch([research_texts[i] for i in part]) for part in parts)
+        )
+        for part, output in zip(parts, outputs):
+            for i, response in zip(part, output):
+                responses[i] = response
+        return responses
+
+    async def _generate_batch(self, research_texts: list[str]) -> list[str]:
+        """Answer uncached inputs in one call, as described in get_response_batch()."""
+        if len(research_texts) == 1:
+            return [await self.get_response(research_texts[0])]
+
+        documents = "\n\n".join(
+            f"[{n}] {text}" for n, text in enumerate(research_texts, 1)
+        )
+        response = await self._generate_content(
+            user_content(
+                f"Documents:\n{documents}\n\n"
+                "Return a JSON array where element i corresponds to document i."
+            ),
+            batch_size=len(research_texts),
+        )
+        items = orjson.loads(response.text or "null")
+        if not isinstance(items, list) or len(items) != len(research_texts):
+            raise ValueError(
+                f"Expected {len(research_texts)} batched responses from "
+                f"{type(self).__name__}, got {type(items).__name__}"
+            )
+        complete = _finish_reason(response) == types.FinishReason.STOP
+        responses = []
+        for research_text, item in zip(research_texts, items):
+            response_text = orjson.dumps(item).decode()
+            if complete:
+                await self._store_response(research_text, response_text)
+            responses.append(response_text)
+        return responses
+
+    async def _generate_content(
+        self, contents: types.Content, batch_size: int = 1
+    ) -> types.GenerateContentResponse:
+        """
+        Call generate_content, retrying transient failures.
+
+        A context cache can disappear before its known expiry (deleted, or
+        expired server-side while the process was suspended). The call is
+        then repeated once with a freshly created cache or inline
+        instructions. Rate limits, server errors and timeouts are retried
+        with exponential backoff (see _backoff).
+        """
+        attempt = 0
+        cache_retried = False
+        while True:
+            config = await self._generate_config(batch_size)
+            if self.rate_limiter is not None:
+                await self.rate_limiter.acquire()
+            try:
+                return await self.client.aio.models.generate_content(
+                    model=self.model, contents=contents, config=config
+                )
+            except (errors.APIError, httpx.TimeoutException) as e:
+                if not cache_retried and self._drop_lost_cache(config, e):
+                    cache_retried = True
+                    continue
+                if self._drop_thinking_budget(config, e):
+                    continue
+                await self._backoff(attempt, e)
+                attempt += 1
+
+    async def _backoff(self, attempt: int, error: Exception) -> None:
+        """
+        Sleep before retrying a failed call, or re-raise error.
+
+        Only 429 and 5xx responses and timeouts are retried, at most
+        MAX_RETRIES times. The delay is drawn uniformly up to an
+        exponentially growing cap ("full jitter"), so concurrent calls that
+        failed together do not retry in lockstep.
+        """
+        if isinstance(error, errors.APIError):
+            retryable = error.code == 429 or (error.code or 0) >= 500
+        else:
+            retryable = isinstance(error, httpx.TimeoutException)
+        if not retryable or attempt >= MAX_RETRIES:
+            raise error
+        delay = random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2**attempt))
+        logger.warning(
+            "%s call failed (%s), retrying in %.1fs", type(self).__name__, error, delay
+        )
+        await asyncio.sleep(delay)
+
+    def _drop_lost_cache(
+        self, config: types.GenerateContentConfig, error: Exception
+    ) -> bool:
+        """
+        Forget the cached instruction if error says config's cache is gone.
+
+        Returns:
+            Whether the call should be retried
+        """
+        if config.cached_content is None or not isinstance(error, errors.ClientError):
+            return False
+        if error.code != 404 and "cache" not in str(error).lower():
+            return False
+        logger.warning(
+            "Context cache for %s is gone, recreating it: %s", type(self).__name__, error
+        )
+        if self._cache_name == config.cached_content:
+            self._cache_name = None
+            self._cache_expires_at = 0.0
+        return True
+
+    def _drop_thinking_budget(
+        self, config: types.GenerateContentConfig, error: Exception
+    ) -> bool:
+        """
+        Stop sending the thinking budget if error says the model rejects it,
+        as models that only run with thinking (e.g. gemini-2.5-pro) do for 0.
+
+        Returns:
+            Whether the call should be retried
+        """
+        if config.thinking_config is None or not isinstance(error, errors.ClientError):
+            return False
+        if error.code != 400 or "thinking" not in str(error).lower():
+            return False
+        logger.warning(
+            "%s rejects thinking budget %s, using its default: %s",
+            self.model,
+            self.thinking_budget,
+            error,
+        )
+        self.thinking_budget = None
+        self._configs.clear()
+        self._disk_key_prefix = self._make_disk_key_prefix()
+        return True
+
+    async def _cached_response(self, research_text: str) -> Optional[str]:
+        """Look research_text up in the response cache, then the disk cache."""
+        if self.response_cache is not None:
+            cached = await self.response_cache.get(self.cache_namespace, research_text)
+            if cached is not None:
+                return cached
+        if self.disk_cache is not None:
+            cached = self.disk_cache.get(self._disk_key(research_text))
+            if cached is not None and self.response_cache is not None:
+                await self.response_cache.put(
+                    self.cache_namespace, research_text, cached
+                )
+            return cached
+        return None
+
+    async def _store_response(self, research_text: str, response: str) -> None:
+        """
+        Cache response for research_text if it follows the response schema.
+
+        Callers only pass responses that finished normally. A malformed one
+        would otherwise be served for every later call with the same input
+        until it expires, even across restarts.
+        """
+        try:
+            self.response_schema.model_validate_json(response)
+        except ValidationError as e:
+            logger.warning(
+                "Not caching %s response with %d schema errors",
+                type(self).__name__,
+                e.error_count(),
+            )
+            return
+        if self.response_cache is not None:
+            await self.response_cache.put(self.cache_namespace, research_text, response)
+        if self.disk_cache is not None:
+            self.disk_cache.set(self._disk_key(research_text), response)
+
+    def _make_disk_key_prefix(self) -> bytes:
+        # Disk cache keys cover everything that determines the response
+        return hashlib.sha256(
+            f"{self.model}|{self.thinking_budget}|{self._sys_instructions}|"
+            f"{self._response_json_schema}|".encode()
+        ).digest()
+
+    def _disk_key(self, research_text: str) -> str:
+        return hashlib.sha256(
+            self._disk_key_prefix + research_text.encode()
+        ).hexdigest()
+
+    async def _generate_config(self, batch_size: int = 1) -> types.GenerateContentConfig:
+        """
+        Return the generation config for one call.
+
+        Configs are built once per batch size and reused until the cached
+        system instruction changes.
+
+        Args:
+            batch_size: Number of inputs answered by the call. Above 1 the
+                response is an array of per-input objects.
+        """
+        cache_name = await self.ensure_cache()
+        if cache_name != self._configs_cache_name:
+            self._configs.clear()
+            self._configs_cache_name = cache_name
+        config = self._configs.get(batch_size)
+        if config is None:
+            config = self._build_config(batch_size, cache_name)
+            self._configs[batch_size] = config
+        return config
+
+    def _build_config(
+        self, batch_size: int, cache_name: Optional[str]
+    ) -> types.GenerateContentConfig:
+        json_schema = self._response_json_schema
+        max_output_tokens = self.max_output_tokens
+        if batch_size > 1:
+            json_schema = {
+                "type": "array",
+                "items": json_schema,
+                "minItems": batch_size,
+                "maxItems": batch_size,
+            }
+            if max_output_tokens is not None:
+                max_output_tokens = min(
+                    max_output_tokens * batch_size, MODEL_OUTPUT_TOKEN_LIMIT
+                )
+
+        if cache_name is not None:
+            instructions = {"cached_content": cache_name}
+        else:
+            instructions = {"system_instruction": self._sys_instructions}
+        thinking_config = (
+            types.ThinkingConfig(thinking_budget=self.thinking_budget)
+            if self.thinking_budget is not None
+            else None
+        )
+        return types.GenerateContentConfig(
+            temperature=0.0,
+            candidate_count=1,
+            max_output_tokens=max_output_tokens,
+            thinking_config=thinking_config,
+            response_mime_type="application/json",
+            response_json_schema=json_schema,
+            **instructions,
+        )
+
+    async def ensure_cache(self) -> Optional[str]:
+        """
+        Return the name of the cached system instruction, creating it if needed.
+
+        A cache close to expiry keeps being used while its TTL is extended in
+        the background.
+
+        Returns:
+            The cached content name, or None if caching is unavailable
+        """
+        if self._cacheable is False:
+            return None
+        remaining = self._cache_expires_at - time.monotonic()
+        if self._cache_name is not None and remaining > 0:
+            if remaining < CACHE_REFRESH_MARGIN and self._refresh_task is None:
+                self._refresh_task = asyncio.create_task(self._refresh_cache())
+            return self._cache_name
+        if time.monotonic() < self._cache_retry_at:
+            return None
+
+        await self._refresh_cache()
+        return self._cache_name
+
+    async def delete_cache(self) -> None:
+        """Delete the cached system instruction, if any, so it stops accruing storage."""
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+        async with self._cache_lock:
+            if self._cache_name is None:
+                return
+            try:
+                await self.client.aio.caches.delete(name=self._cache_name)
+            except (errors.APIError, httpx.HTTPError) as e:
+                logger.warning(
+                    "Could not delete context cache for %s: %r", type(self).__name__, e
+                )
+            self._cache_name = None
+            self._cache_expires_at = 0.0
+
+    async def _refresh_cache(self) -> None:
+        """Create the cached content, or extend the TTL of the existing one."""
+        async with self._cache_lock:
+            try:
+                now = time.monotonic()
+                if now < self._cache_expires_at - CACHE_REFRESH_MARGIN or (
+                    self._cache_name is None and now < self._cache_retry_at
+                ):
+                    return  # Handled by another caller while we waited
+
+                ttl = f"{self.cache_ttl}s"
+                try:
+                    if self._cacheable is None:
+                        count = await self.client.aio.models.count_tokens(
+                            model=self.model, contents=self._sys_instructions
+                        )
+                        total_tokens = count.total_tokens or 0
+                        self._cacheable = total_tokens >= self._min_cache_tokens
+                        if not self._cacheable:
+                            logger.info(
+                                "System instruction for %s is too short to cache; "
+                                "sending it inline",
+                                type(self).__name__,
+                            )
+                            return
+
+                    if self._cache_name is None:
+                        cache = await self.client.aio.caches.create(
+                            model=self.model,
+                            config=types.CreateCachedContentConfig(
+                                system_instruction=self._sys_instructions,
+                                ttl=ttl,
+                            ),
+                        )
+                        self._cache_name = cache.name
+                    else:
+                        await self.client.aio.caches.update(
+                            name=self._cache_name,
+                            config=types.UpdateCachedContentConfig(ttl=ttl),
+                        )
+                    self._cache_expires_at = time.monotonic() + self.cache_ttl
+                except (errors.APIError, httpx.HTTPError) as e:
+                    # Includes transport errors, e.g. a brief outage at startup
+                    logger.warning(
+                        "Context cache unavailable for %s: %r", type(self).__name__, e
+                    )
+                    self._cache_name = None
+                    self._cache_expires_at = 0.0
+                    # Fall back to inline instructions until the next attempt
+                    self._cache_retry_at = time.monotonic() + self.cache_ttl
+            finally:
+                self._refresh_task = None
+
+
+def _finish_reason(
+    response: types.GenerateContentResponse,
+) -> Optional[types.FinishReason]:
+    """Finish reason of the first candidate, if the response (chunk) has one."""
+    candidates = response.candidates
+    return candidates[0].finish_reason if candidates else None
+
+
+def _empty_json(schema: dict, defs: dict):
+    """Build the value of a JSON Schema with nothing identified in the input."""
+    if "$ref" in schema:
+        return _empty_json(defs[schema["$ref"].rsplit("/", 1)[-1]], defs)
+    if schema.get("type") == "object":
+        return {
+            name: _empty_json(prop, defs)
+            for name, prop in schema.get("properties", {}).items()
+        }
+    if schema.get("type") == "array":
+        return []
+    if schema.get("type") == "string":
+        return NOT_SPECIFIED
+    return None
+
+
+def _merge_json(current, value):
+    """
+    Merge two JSON values analyzed from different parts of one input.
+
+    Objects are merged key by key, lists are concatenated without
+    duplicates, and otherwise the first specified value wins.
+    """
+    if current in (None, "", NOT_SPECIFIED):
+        return value
+    if isinstance(current, dict) and isinstance(value, dict):
+        merged = dict(current)
+        for key, item in value.items():
+            merged[key] = _merge_json(merged.get(key), item)
+        return merged
+    if isinstance(current, list) and isinstance(value, list):
+        return current + [item for item in value if item not in current]
+    return current
+
+
+def _split_paragraphs(text: str, max_chars: int) -> list[str]:
+    """
+    Split text into chunks of at most max_chars, preferring paragraph breaks.
+
+    Paragraphs longer than max_chars on their own are cut at max_chars.
+    """
+    chunks = []
+    current = ""
+    for paragraph in text.split("\n\n"):
+        while len(paragraph) > max_chars:
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.append(paragraph[:max_chars])
+            paragraph = paragraph[max_chars:]
+        if current and len(current) + 2 + len(paragraph) > max_chars:
+            chunks.append(current)
+            current = paragraph
+        else:
+            current = f"{current}\n\n{paragraph}" if current else paragraph
+    if current.strip():
+        chunks.append(current)
+    return chunks
@@ -1,52 +1,91 @@
 """Literature Scout Agent for discovering related research."""
 
+from typing import Literal, Optional
+
 from google import genai
-from google.genai import types
 
+from cache import SemanticCache
+from gemini_agent import GeminiAgent, RateLimiter
+from llm_cache import LLMCache
+from schemas import LiteratureScoutOutput, RelatedWorkOutput
 
-class LiteratureScoutAgent:
-    def __init__(self, api_key: str, model: str = "gemini-2.5-flash"):
-        self.client = genai.Client(api_key=api_key)
-        self.model = model
+# Upper bound on generated tokens (including thinking) per response
+MAX_OUTPUT_TOKENS = 2048
 
-    def get_response(self, research_text: str) -> str:
-        """
-        Generate a response from the LLM.
+# Thinking disabled; suggesting topics and titles gains little from it
+THINKING_BUDGET = 0
 
-        Args:
-            research_text (str): The input.
+TITLES_ONLY_SYS_INSTRUCTIONS = """You are an expert research librarian and domain expert. The user message contains the Ongoing Research Structured Summary. Based on the given information on the Ongoing Research Structured Summary:
 
-        Returns:
-            str: Generated response from the LLM.
-        """
+**Suggest example paper titles**: Generate realistic example titles of papers (with their authors) that would be related to this research (these can be synthetic but should be plausible and informative)
 
-        # System instructions
-        sys_instructions = f"""You are an expert research librarian and domain expert. Based on the given information on the Ongoing Research Structured Summary:
+Generate at least 3-5 items if the given Ongoing Research Structured Summary is sufficiently detailed. If not, generate an empty list.
+"""
 
-**Suggest example paper titles**: Generate realistic example titles of papers (with their authors) that would be related to this research (these can be synthetic but should be plausible and informative)
+FULL_SYS_INSTRUCTIONS = """You are an expert research librarian and domain expert. The user message contains the Ongoing Research Structured Summary. Based on the given information on the Ongoing Research Structured Summary:
 
-You MUST respond with ONLY a valid JSON object in this exact format:
-{{
-  "example_related_work": ["Paper 1", "Paper 2", "Paper 3", ..., "Paper n"]
-}}
+1. **Infer research topics**: Identify the main research topics and areas the work belongs to
+2. **Suggest search queries**: Propose keywords and search queries for finding related literature
+3. **Suggest example paper titles**: Generate realistic example titles of papers (with their authors) that would be related to this research (these can be synthetic but should be plausible and informative)
 
-Generate at least 3-5 items if the given Ongoing Research Structured Summary is sufficiently detailed. If not, generate an empty list. Do not include any text before or after the JSON. Avoid any markdown formatting.
-        """
+Generate at least 3-5 items per list if the given Ongoing Research Structured Summary is sufficiently detailed. If not, generate empty lists.
+"""
 
-        query = f"""Ongoing Research Structured Summary:
+SYS_INSTRUCTIONS = {
+    "titles_only": TITLES_ONLY_SYS_INSTRUCTIONS,
+    "full": FULL_SYS_INSTRUCTIONS,
+}
 
-{research_text}
+RESPONSE_SCHEMAS = {
+    "titles_only": RelatedWorkOutput,
+    "full": LiteratureScoutOutput,
+}
+
+
+class LiteratureScoutAgent(GeminiAgent):
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        model: str = "gemini-2.5-flash",
+        client: Optional[genai.Client] = None,
+        mode: Literal["titles_only", "full"] = "full",
+        response_cache: Optional[SemanticCache] = None,
+        disk_cache: Optional[LLMCache] = None,
+        rate_limiter: Optional[RateLimiter] = None,
+        thinking_budget: Optional[int] = THINKING_BUDGET,
+    ):
         """
+        Initialize the Literature Scout Agent.
 
-        # Generate a response from the llm
-        response = self.client.models.generate_content(
-            model=self.model,
-            contents=query,
-            config=types.GenerateContentConfig(
-                temperature=0.0,
-                system_instruction=sys_instructions
-            )
-        )
-        response = response.text
+        Args:
+            api_key: Google API key for Gemini
+            model: Gemini model to use
+            client: Gemini client to use. If None, agents share one client
+                per API key and event loop
+            mode: "full" infers topics, search queries and related work;
+                "titles_only" suggests related paper titles only
+            response_cache: Cache of previous responses to serve repeats from
+            disk_cache: Persistent cache of previous responses
+            rate_limiter: Limiter shared with the other agents
+            thinking_budget: Cap on thinking tokens, or None for the model's
+                default
 
-        return response
+        Raises:
+            ValueError: If mode is not "titles_only" or "full"
+        """
+        if mode not in SYS_INSTRUCTIONS:
+            raise ValueError(f"Unknown literature scout mode: {mode!r}")
+        super().__init__(
+            SYS_INSTRUCTIONS[mode],
+            RESPONSE_SCHEMAS[mode],
+            api_key,
+            model,
+            client,
+            max_output_tokens=MAX_OUTPUT_TOKENS,
+            thinking_budget=thinking_budget,
+            response_cache=response_cache,
+            disk_cache=disk_cache,
+            rate_limiter=rate_limiter,
+        )
+        self.mode = mode
+        self.cache_namespace = f"{self.cache_namespace}:{mode}"
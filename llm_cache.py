@@ -0,0 +1,68 @@
+"""Persistent on-disk cache of agent responses."""
+
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+DEFAULT_PATH = ".erevna-cache.sqlite3"
+
+
+class LLMCache:
+    """
+    SQLite-backed key-value store for LLM responses with a TTL.
+
+    Agents call Gemini at temperature 0, so a response can be reused for
+    any later call with the same model, instructions and input, including
+    across process restarts. Lookups are single-row primary-key queries on
+    a local file, cheap enough to run directly on the event loop.
+    """
+
+    def __init__(self, path: str = DEFAULT_PATH, ttl_secs: int = 7 * 24 * 3600):
+        """
+        Open (or create) the cache.
+
+        Args:
+            path: SQLite database file
+            ttl_secs: Lifetime of a cached response in seconds
+        """
+        self.path = path
+        self.ttl_secs = ttl_secs
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, response TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "DELETE FROM responses WHERE expires_at <= ?", (time.time(),)
+            )
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the response stored under key, or None if absent or expired."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, expires_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None or row[1] <= time.time():
+            return None
+        return row[0]
+
+    def set(self, key: str, response: str) -> None:
+        """Store a response under key, replacing any previous one."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?)",
+                (key, response, time.time() + self.ttl_secs),
+            )
+
+    def clear(self) -> None:
+        """Drop every stored response."""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM responses")
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -1,15 +1,39 @@
 """FastAPI entrypoint for the research analysis system."""
 
-from fastapi import Body, FastAPI, HTTPException
+import os
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from dotenv import load_dotenv
+import orjson
 
 from orchestrator import ResearchAnalysisOrchestrator
+from schemas import AnalysisRequest
 
 from fastapi.middleware.cors import CORSMiddleware
 
 load_dotenv()
 
-app = FastAPI(title="Erevna Research Analysis API")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Build the orchestrator (and its Gemini client) once and reuse it
+    threshold = os.getenv("EREVNA_SEMANTIC_THRESHOLD")
+    app.state.orchestrator = ResearchAnalysisOrchestrator(
+        disk_cache_path=os.getenv("EREVNA_DISK_CACHE"),
+        semantic_threshold=float(threshold) if threshold else None,
+        semantic_cache_path=os.getenv("EREVNA_SEMANTIC_CACHE"),
+    )
+    yield
+    await app.state.orchestrator.aclose()
+
+
+app = FastAPI(
+    title="Erevna Research Analysis API",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse,
+)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -21,25 +45,32 @@ app.add_middleware(
 def read_root():
     return {"message": "Erevna."}
 
-@app.post("/analyze")
-def analyze_research(payload: dict = Body(...)) -> dict:
+# The orchestrator's defaults already guarantee the response shape, so skip
+# response-model validation and serialize the dict in a single orjson call.
+@app.post("/analyze", response_model=None)
+async def analyze_research(request: Request, body: AnalysisRequest) -> ORJSONResponse:
+    try:
+        orchestrator = request.app.state.orchestrator
+        return ORJSONResponse(await orchestrator.analyze(body.text))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+# Emits one JSON object per line, {section name: section result}, as soon
+# as each section is ready, so clients can render the research structure
+# while the downstream agents are still running.
+@app.post("/analyze/stream")
+async def analyze_research_stream(request: Request, body: AnalysisRequest) -> StreamingResponse:
+    sections = request.app.state.orchestrator.analyze_stream(body.text)
     try:
-        if not isinstance(payload, dict):
-            raise HTTPException(status_code=400, detail="Invalid JSON payload")
-
-        text = payload.get("text")
-        if not isinstance(text, str) or not text.strip():
-            raise HTTPException(
-                status_code=400, detail="Field 'text' must be a non-empty string"
-            )
-
-        parallel = payload.get("parallel", True)
-        if not isinstance(parallel, bool):
-            raise HTTPException(
-                status_code=400, detail="Field 'parallel' must be a boolean"
-            )
-
-        orchestrator = ResearchAnalysisOrchestrator()
-        return orchestrator.analyze(text, parallel=False)
+        # Errors before the first section can still become a proper status
+        first = await sections.__anext__()
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
+
+    async def lines():
+        yield orjson.dumps(dict([first])) + b"\n"
+        async for section in sections:
+            yield orjson.dumps(dict([section])) + b"\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
@@ -1,31 +1,200 @@
 """Orchestrator for coordinating all research analysis agents."""
 
-import json
+import asyncio
+import copy
+import hashlib
+import logging
 import os
-from typing import Optional
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import sys
+from collections import OrderedDict
+from typing import AsyncIterator, Iterable, Literal, Optional
 
+import httpx
+import orjson
+from google import genai
+from google.genai import errors, types
+
+from cache import SemanticCache
+from fused_analysis_agent import FusedAnalysisAgent
+from gemini_agent import (
+    NOT_SPECIFIED,
+    GeminiAgent,
+    RateLimiter,
+    close_client,
+    create_client,
+    create_http_client,
+)
+from llm_cache import LLMCache
 from research_structure_agent import ResearchStructureAgent
-from validity_threat_agent import ValidityThreatAgent
+from validity_threat_agent import FAST_MODEL, ValidityThreatAgent
 from literature_scout_agent import LiteratureScoutAgent
 
+logger = logging.getLogger(__name__)
+
+# Model used to embed agent inputs for semantic cache lookups
+EMBEDDING_MODEL = "gemini-embedding-001"
+
+# Labels of the research structure fields in the downstream agents' input
+SUMMARY_LABELS = (
+    ("research_question", "Research question"),
+    ("hypothesis", "Hypothesis"),
+    ("method", "Method"),
+    ("variables", "Variables"),
+    ("dataset", "Dataset"),
+    ("evaluation", "Evaluation"),
+)
+
+
+# Agents an orchestrator can run; the research structure always runs
+AGENTS = ("structure", "validity", "literature")
+
+# Inputs shorter than this (after stripping) are not sent to the agents
+MIN_TEXT_LENGTH = 200
+
+# Inputs with more tokens are analyzed in chunks of at most this size
+LONG_INPUT_TOKENS = 100_000
+
+TOO_SHORT_ERROR = "Input text too short for meaningful analysis."
+
+# Separator line between report sections
+RULE = "=" * 80
+
+# Top-level sections of an analysis result, in report order
+SECTIONS = ("research_structure", "validity_threats", "literature_scout")
+
+# Last lines of the printed report
+REPORT_FOOTER = "\n".join(["", RULE, "✅ Analysis Complete!", RULE, ""])
+
+# Report sections listing a results field: (field, heading)
+VALIDITY_SECTIONS = (
+    ("internal_validity", "🔴 Internal Validity"),
+    ("external_validity", "🟠 External Validity"),
+    ("construct_validity", "🟡 Construct Validity"),
+    ("conclusion_validity", "🟢 Conclusion Validity"),
+    ("mitigation_suggestions", "💡 Mitigation Suggestions"),
+)
+LITERATURE_SECTIONS = (
+    ("inferred_topics", "🎯 Inferred Topics"),
+    ("search_queries", "🔎 Search Queries"),
+    ("example_related_work", "📄 Example Related Work"),
+)
+
+
+def _append_list_sections(
+    lines: list[str], section: dict, headings: tuple[tuple[str, str], ...]
+) -> None:
+    """Append a bulleted list for each non-empty field of section."""
+    for key, heading in headings:
+        items = section.get(key)
+        if items:
+            lines.append(f"\n{heading}:")
+            lines.extend([f"  • {item}" for item in items])
+
+
+async def _get_response(
+    agent: Optional[GeminiAgent], research_text: str
+) -> Optional[str]:
+    """Call agent on research_text, or return None if the agent is disabled."""
+    if agent is None:
+        return None
+    return await agent.get_response(research_text)
+
+
+async def _get_response_batch(
+    agent: Optional[GeminiAgent], research_texts: list[str]
+) -> list[Optional[str]]:
+    if agent is None:
+        return [None] * len(research_texts)
+    return await agent.get_response_batch(research_texts)
+
+
+def _strip_fences(response: str) -> str:
+    """
+    Remove a Markdown code fence wrapped around a JSON response.
+
+    Only the first few characters are inspected, so unfenced responses are
+    returned as-is without scanning or copying the whole string.
+    """
+    if not response[:8].lstrip().startswith("`"):
+        return response
+    start = response.find("{")
+    end = response.rfind("}")
+    if start == -1 or end < start:
+        return response
+    return response[start:end + 1]
+
 
 class ResearchAnalysisOrchestrator:
     """
     Orchestrates the three agents to perform comprehensive research analysis.
     
-    Agents can run in parallel for efficiency.
+    The two downstream agents run concurrently once the structure is known.
+    In fused mode a single agent produces all three results in one call
+    instead.
     """
     
-    def __init__(self, api_key: Optional[str] = None, model: str = "gemini-2.5-flash"):
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        model: str = "gemini-2.5-flash",
+        cache_size: int = 128,
+        semantic_threshold: Optional[float] = None,
+        client: Optional[genai.Client] = None,
+        mode: Literal["agents", "fused"] = "agents",
+        min_text_length: int = MIN_TEXT_LENGTH,
+        disk_cache_path: Optional[str] = None,
+        agents: Iterable[str] = AGENTS,
+        requests_per_minute: Optional[float] = None,
+        semantic_cache_path: Optional[str] = None,
+        validity_fast_model: Optional[str] = FAST_MODEL,
+        long_input_tokens: Optional[int] = LONG_INPUT_TOKENS,
+        thinking_budget: Optional[int] = 0,
+    ):
         """
         Initialize the orchestrator with all agents.
         
         Args:
             api_key: Google API key. If None, reads from GOOGLE_API_KEY env var
             model: Gemini model to use
+            cache_size: Number of recent analyses kept in memory (0 disables)
+            semantic_threshold: Cosine similarity above which an agent reuses
+                the cached response of a near-duplicate input, e.g.
+                cache.DEFAULT_THRESHOLD. If None, agents only reuse responses
+                for identical inputs
+            client: Gemini client shared by all agents. If None, one is
+                created from api_key
+            mode: "agents" runs the three agents as a pipeline; "fused" asks
+                one agent for the whole analysis in a single call
+            min_text_length: Inputs with fewer characters, or without any
+                letters, get an empty analysis without calling the agents
+            disk_cache_path: SQLite file persisting agent responses across
+                runs. If None, responses are only cached in memory
+            agents: Agents to run in "agents" mode, among "structure",
+                "validity" and "literature". Results of skipped agents are
+                left empty, and their Gemini calls are not made
+            requests_per_minute: Cap on Gemini generation requests across
+                all agents. If None, requests are not throttled
+            semantic_cache_path: File the in-memory response cache is loaded
+                from, if it exists, and saved to by aclose()
+            validity_fast_model: Cheaper model asked first for the validity
+                threats, escalating to model when its answer looks wrong.
+                If None, the validity agent only uses model
+            long_input_tokens: Inputs with more tokens are split into chunks
+                analyzed concurrently, instead of being sent in one call.
+                If None, inputs are never split
+            thinking_budget: Cap on the agents' thinking tokens. The default
+                0 disables thinking; None keeps the model's default
         """
-        if api_key is None:
+        if mode not in ("agents", "fused"):
+            raise ValueError(f"Unknown orchestrator mode: {mode!r}")
+        agents = set(agents)
+        if not agents <= set(AGENTS):
+            raise ValueError(f"Unknown agents: {sorted(agents - set(AGENTS))}")
+        if "structure" not in agents:
+            raise ValueError("The structure agent is required by the others")
+        if mode == "fused" and agents != set(AGENTS):
+            raise ValueError("Fused mode always runs every agent")
+        if client is None and api_key is None:
             api_key = os.getenv("GOOGLE_API_KEY")
             if not api_key:
                 raise ValueError(
@@ -33,263 +202,743 @@ class ResearchAnalysisOrchestrator:
                     "Set it as environment variable or pass as parameter."
                 )
         
-        # Initialize all agents
-        self.research_agent = ResearchStructureAgent(api_key, model)
-        self.validity_agent = ValidityThreatAgent(api_key, model)
-        self.literature_agent = LiteratureScoutAgent(api_key, model)
+        # One client (and connection pool) shared by all agents
+        self._owns_client = client is None
+        if client is None:
+            self._http_client = create_http_client()
+            client = create_client(api_key, self._http_client)
+        self.client = client
+
+        # Response cache shared by all agents (each under its own namespace)
+        self.response_cache = SemanticCache(
+            embed=self._embed if semantic_threshold is not None else None,
+            threshold=semantic_threshold,
+        )
+        self.semantic_cache_path = semantic_cache_path
+        if semantic_cache_path is not None and os.path.exists(semantic_cache_path):
+            try:
+                self.response_cache.load(semantic_cache_path)
+            except Exception as e:
+                logger.warning("Could not load %s: %s", semantic_cache_path, e)
+
+        # Persistent responses behind the in-memory cache
+        self.disk_cache = (
+            LLMCache(disk_cache_path) if disk_cache_path is not None else None
+        )
+
+        # Quota shared by all agents, which use the same API key
+        self.rate_limiter = (
+            RateLimiter(requests_per_minute)
+            if requests_per_minute is not None
+            else None
+        )
+
+        # Initialize the agents the mode needs
+        self.mode = mode
+        agent_kwargs = dict(
+            model=model,
+            client=self.client,
+            response_cache=self.response_cache,
+            disk_cache=self.disk_cache,
+            rate_limiter=self.rate_limiter,
+            thinking_budget=thinking_budget,
+        )
+        if mode == "fused":
+            self.fused_agent = FusedAnalysisAgent(**agent_kwargs)
+            self._agents: list[GeminiAgent] = [self.fused_agent]
+        else:
+            self.research_agent = ResearchStructureAgent(**agent_kwargs)
+            self.validity_agent = (
+                ValidityThreatAgent(**agent_kwargs, fast_model=validity_fast_model)
+                if "validity" in agents
+                else None
+            )
+            self.literature_agent = (
+                LiteratureScoutAgent(**agent_kwargs)
+                if "literature" in agents
+                else None
+            )
+            self._agents = [
+                agent
+                for agent in (
+                    self.research_agent,
+                    self.validity_agent,
+                    self.validity_agent and self.validity_agent.fast_agent,
+                    self.literature_agent,
+                )
+                if agent is not None
+            ]
+
+        self.min_text_length = min_text_length
+        self.long_input_tokens = long_input_tokens
+
+        # LRU of recent analyses, keyed by a digest of the input text
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[bytes, dict]" = OrderedDict()
+        # Pipeline runs in progress, keyed like the cache
+        self._inflight: dict[bytes, "asyncio.Future[dict]"] = {}
+        # Event loop reused by the blocking entry points, created on first use
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    async def create_caches(self) -> None:
+        """Upload every agent's system instruction as cached content up front."""
+        await asyncio.gather(*(agent.ensure_cache() for agent in self._agents))
     
-    def analyze(self, text: str, parallel: bool = False) -> dict:
+    async def aclose(self) -> None:
+        """
+        Release the orchestrator's resources.
+
+        Cancels analyses in progress, saves the response cache if a path
+        was given, deletes the agents' cached system instructions, closes the
+        disk cache and closes the HTTP connection pool, unless the client
+        was supplied by the caller.
+        """
+        for task in list(self._inflight.values()):
+            task.cancel()
+        if self.semantic_cache_path is not None:
+            try:
+                self.response_cache.save(self.semantic_cache_path)
+            except OSError as e:
+                logger.warning("Could not save %s: %s", self.semantic_cache_path, e)
+        await asyncio.gather(*(agent.delete_cache() for agent in self._agents))
+        if self.disk_cache is not None:
+            self.disk_cache.close()
+        if self._owns_client:
+            await close_client(self.client, self._http_client)
+
+    async def __aenter__(self) -> "ResearchAnalysisOrchestrator":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.aclose()
+
+    def close(self) -> None:
+        """
+        Blocking counterpart of aclose(), for use with analyze_sync() and
+        analyze_and_print(). Also closes their event loop.
+        """
+        try:
+            self._run_sync(self.aclose())
+        finally:
+            loop, self._loop = self._loop, None
+            loop.run_until_complete(loop.shutdown_asyncgens())
+            loop.close()
+
+    def __enter__(self) -> "ResearchAnalysisOrchestrator":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def _run_sync(self, coro):
+        """
+        Run coro to completion on the orchestrator's own event loop.
+
+        The HTTP pool keeps connections bound to the loop that opened them,
+        so every blocking call reuses one loop rather than asyncio.run()'s
+        fresh one.
+        """
+        if self._loop is None:
+            self._loop = asyncio.new_event_loop()
+        return self._loop.run_until_complete(coro)
+
+    async def analyze(self, text: str) -> dict:
         """
         Run all agents on the research text.
 
+        The research structure is extracted first; the validity and literature
+        agents both depend on it and run concurrently afterwards.
+
         Args:
             text: Research text to analyze
-            parallel: If True, run downstream agents in parallel.
 
         Returns:
             Dictionary containing results from all three agents
         """
-        research_json = self.research_agent.get_response(text)
-        research_structure = self._parse_research_structure(research_json)
+        if self._too_short(text):
+            return self._default_analysis(error=TOO_SHORT_ERROR)
 
-        if parallel:
-            validity_threats, literature_scout = self._analyze_downstream_parallel(
-                research_json
-            )
-        else:
-            validity_threats, literature_scout = self._analyze_downstream_sequential(
-                research_json
-            )
+        key = self._cache_key(text)
+        cached = self._cache.get(key)
+        if cached is not None:
+            self._cache.move_to_end(key)
+            return copy.deepcopy(cached)
 
-        return {
+        # Concurrent requests for the same text share one pipeline run
+        while True:
+            task = self._inflight.get(key)
+            if task is None:
+                task = asyncio.ensure_future(self._analyze_uncached(text, key))
+                self._inflight[key] = task
+                task.add_done_callback(lambda _: self._inflight.pop(key, None))
+            try:
+                return copy.deepcopy(await asyncio.shield(task))
+            except asyncio.CancelledError:
+                # A streaming run whose consumer gave up; run it ourselves
+                if not task.cancelled():
+                    raise
+
+    async def analyze_stream(self, text: str) -> AsyncIterator[tuple[str, dict]]:
+        """
+        Run all agents on the research text, yielding each result section as
+        soon as it is ready.
+
+        The research structure is yielded while the downstream agents are
+        still running. Cached, coalesced and fused analyses are yielded
+        all at once.
+
+        Args:
+            text: Research text to analyze
+
+        Yields:
+            (section name, section result) pairs in report order
+        """
+        key = self._cache_key(text)
+        if (
+            self.mode == "fused"
+            or self._too_short(text)
+            or key in self._cache
+            or key in self._inflight
+        ):
+            results = await self.analyze(text)
+            for name in SECTIONS:
+                yield name, results[name]
+            return
+
+        # Concurrent requests for the same text wait for this run. If it
+        # does not complete, they are woken by cancellation and run their own.
+        done = asyncio.get_running_loop().create_future()
+        self._inflight[key] = done
+        results = {}
+        try:
+            async for name, section in self._analyze_sections(text, key):
+                results[name] = section
+                # The remembered result shares these dicts
+                yield name, copy.deepcopy(section)
+            done.set_result(results)
+        finally:
+            done.cancel()
+            if self._inflight.get(key) is done:
+                del self._inflight[key]
+
+    async def _analyze_uncached(self, text: str, key: bytes) -> dict:
+        """Run the full agent pipeline and remember its result under key."""
+        results = {}
+        async for name, section in self._analyze_sections(text, key):
+            results[name] = section
+        return results
+
+    async def _analyze_sections(
+        self, text: str, key: bytes
+    ) -> AsyncIterator[tuple[str, dict]]:
+        """
+        Run the full agent pipeline, yielding each section once it is ready,
+        and remember the complete result under key.
+        """
+        if self.mode == "fused":
+            complete = True
+            if await self._too_long(self.fused_agent, text):
+                response, complete = await self.fused_agent.get_response_long(
+                    text, self.long_input_tokens
+                )
+            else:
+                response = await self.fused_agent.get_response(text)
+            results, parsed = self._parse_fused_analysis(response)
+            if parsed and complete:
+                self._remember(key, results)
+            for name in SECTIONS:
+                yield name, results[name]
+            return
+
+        research_json, downstream, complete = await self._stream_research_structure(
+            text
+        )
+        try:
+            research_structure, parsed = self._parse_research_structure(research_json)
+            yield "research_structure", research_structure
+            validity_threats, literature_scout, failed = await downstream
+        finally:
+            # Stops the downstream agents if the consumer gave up early
+            downstream.cancel()
+
+        results = {
             "research_structure": research_structure,
             "validity_threats": validity_threats,
             "literature_scout": literature_scout,
         }
-    
-    def _analyze_downstream_parallel(
-        self, research_json: str
-    ) -> tuple[dict, dict]:
-        """Run downstream agents in parallel using the research JSON."""
-        results: dict[str, object] = {}
-
-        with ThreadPoolExecutor(max_workers=2) as executor:
-            future_to_agent = {
-                executor.submit(
-                    self.validity_agent.get_response, research_json
-                ): "validity_threats",
-                executor.submit(
-                    self.literature_agent.get_response, research_json
-                ): "literature_scout",
+        # Don't remember results degraded by a (possibly transient) agent error
+        if parsed and complete and not failed:
+            self._remember(key, results)
+        yield "validity_threats", validity_threats
+        yield "literature_scout", literature_scout
+
+    async def analyze_batch(self, texts: list[str]) -> list[dict]:
+        """
+        Run all agents on several research texts, batching the LLM calls.
+
+        Each agent answers every uncached text in a single call, so N texts
+        cost three round-trips instead of 3N. A single text takes the regular
+        analyze() path.
+
+        Args:
+            texts: Research texts to analyze
+
+        Returns:
+            One result dictionary per text, in input order
+        """
+        if len(texts) <= 1:
+            return [await self.analyze(text) for text in texts]
+
+        keys = [self._cache_key(text) for text in texts]
+        results: list[Optional[dict]] = [None] * len(texts)
+        for i, key in enumerate(keys):
+            if self._too_short(texts[i]):
+                results[i] = self._default_analysis(error=TOO_SHORT_ERROR)
+                continue
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                results[i] = copy.deepcopy(cached)
+        missing = [i for i, result in enumerate(results) if result is None]
+        if len(missing) <= 1:
+            for i in missing:
+                results[i] = await self.analyze(texts[i])
+            return results
+
+        agent = self.fused_agent if self.mode == "fused" else self.research_agent
+        try:
+            responses = await agent.get_response_batch([texts[i] for i in missing])
+        except Exception as e:
+            logger.warning("Batched analysis failed, analyzing one by one: %s", e)
+            analyses = await asyncio.gather(*(self.analyze(texts[i]) for i in missing))
+            for i, analysis in zip(missing, analyses):
+                results[i] = analysis
+            return results
+
+        if self.mode == "fused":
+            for i, response in zip(missing, responses):
+                result, parsed = self._parse_fused_analysis(response)
+                if parsed:
+                    self._remember(keys[i], copy.deepcopy(result))
+                results[i] = result
+            return results
+        research_responses = responses
+
+        summaries = [self._research_summary(r) for r in research_responses]
+        validity_responses, literature_responses = await asyncio.gather(
+            _get_response_batch(self.validity_agent, summaries),
+            _get_response_batch(self.literature_agent, summaries),
+            return_exceptions=True,
+        )
+        # A failed batch call fails every item in it
+        if isinstance(validity_responses, BaseException):
+            validity_responses = [validity_responses] * len(missing)
+        if isinstance(literature_responses, BaseException):
+            literature_responses = [literature_responses] * len(missing)
+
+        for n, i in enumerate(missing):
+            validity_threats, literature_scout, failed = self._downstream_results(
+                validity_responses[n], literature_responses[n]
+            )
+            research_structure, parsed = self._parse_research_structure(
+                research_responses[n]
+            )
+            result = {
+                "research_structure": research_structure,
+                "validity_threats": validity_threats,
+                "literature_scout": literature_scout,
             }
+            if parsed and not failed:
+                self._remember(keys[i], copy.deepcopy(result))
+            results[i] = result
+        return results
+
+    async def _too_long(self, agent: GeminiAgent, text: str) -> bool:
+        """
+        Whether text has more than long_input_tokens tokens for agent.
+
+        A token spans at least one character, so tokens are only counted,
+        with a count_tokens request, for texts longer than the limit in
+        characters. If counting fails, text is taken not to be too long: a
+        single request is then tried, rather than failing the analysis.
+        """
+        if self.long_input_tokens is None or len(text) <= self.long_input_tokens:
+            return False
+        try:
+            return await agent.count_tokens(text) > self.long_input_tokens
+        except (errors.APIError, httpx.HTTPError) as e:
+            logger.warning("Could not count tokens, not chunking: %r", e)
+            return False
 
-            for future in as_completed(future_to_agent):
-                agent_name = future_to_agent[future]
-                try:
-                    results[agent_name] = future.result()
-                except Exception as e:
-                    print(f"Error in {agent_name}: {e}")
-                    if agent_name == "validity_threats":
-                        results[agent_name] = self._default_validity_threats(
-                            error=f"Error: {str(e)}"
-                        )
-                    else:
-                        results[agent_name] = self._default_literature_scout(
-                            error=f"Error: {str(e)}"
-                        )
-
-        validity_output = results.get("validity_threats")
-        literature_output = results.get("literature_scout")
-
-        if isinstance(validity_output, str):
-            validity_output = self._parse_validity_threats(validity_output)
-        if isinstance(literature_output, str):
-            literature_output = self._parse_literature_scout(literature_output)
-
-        return (
-            validity_output or self._default_validity_threats(),
-            literature_output or self._default_literature_scout(),
+    def _too_short(self, text: str) -> bool:
+        """Whether text is too short or letter-free to be worth analyzing."""
+        stripped = text.strip()
+        return len(stripped) < self.min_text_length or not any(
+            c.isalpha() for c in stripped
         )
-    
-    def _analyze_downstream_sequential(
-        self, research_json: str
-    ) -> tuple[dict, dict]:
-        """Run downstream agents sequentially using the research JSON."""
-        validity_response = self.validity_agent.get_response(research_json)
-        literature_response = self.literature_agent.get_response(research_json)
 
-        validity_threats = self._parse_validity_threats(validity_response)
-        literature_scout = self._parse_literature_scout(literature_response)
+    def _cache_key(self, text: str) -> bytes:
+        return hashlib.blake2b(text.strip().encode(), digest_size=16).digest()
+
+    def _remember(self, key: bytes, results: dict) -> None:
+        """Store results in the LRU, evicting the oldest entry if it is full."""
+        if self.cache_size <= 0:
+            return
+        # Callers only ever receive copies, so the result can be shared
+        self._cache[key] = results
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    async def _stream_research_structure(
+        self, text: str
+    ) -> tuple[str, "asyncio.Future[tuple[dict, dict, bool]]", bool]:
+        """
+        Stream the research structure and start the downstream agents early.
+
+        The downstream agents are launched as soon as the streamed text forms
+        a complete JSON object, overlapping them with the tail of the stream.
+        An input above long_input_tokens is not streamed but analyzed in
+        chunks.
 
-        return validity_threats, literature_scout
+        Returns:
+            The full research JSON, the pending downstream analysis and
+            whether the JSON covers the whole input (False if some chunks of
+            a long input could not be analyzed)
+        """
+        if await self._too_long(self.research_agent, text):
+            research_json, complete = await self.research_agent.get_response_long(
+                text, self.long_input_tokens
+            )
+            downstream = asyncio.ensure_future(
+                self._analyze_downstream(self._research_summary(research_json))
+            )
+            return research_json, downstream, complete
 
-    def _parse_research_structure(self, response: str) -> dict:
+        parts = []
+        downstream = None
         try:
-            parsed = json.loads(response)
-            if isinstance(parsed, dict):
-                return self._merge_defaults(self._default_research_structure(), parsed)
-            return self._default_research_structure(
-                error="Failed to parse research structure: JSON is not an object"
+            async for chunk in self.research_agent.stream_response(text):
+                parts.append(chunk)
+                if downstream is None and chunk.rstrip().endswith("}"):
+                    candidate = "".join(parts)
+                    try:
+                        orjson.loads(_strip_fences(candidate))
+                    except orjson.JSONDecodeError:
+                        continue
+                    downstream = asyncio.ensure_future(
+                        self._analyze_downstream(self._research_summary(candidate))
+                    )
+        except BaseException:
+            if downstream is not None:
+                downstream.cancel()
+            raise
+
+        research_json = "".join(parts)
+        if downstream is None:
+            downstream = asyncio.ensure_future(
+                self._analyze_downstream(self._research_summary(research_json))
             )
+        return research_json, downstream, True
+
+    def analyze_sync(self, text: str) -> dict:
+        """
+        Blocking wrapper around analyze() for scripts and the CLI.
+
+        Runs the pipeline on the orchestrator's own event loop, so it must
+        not be called from async code. Call close() when done.
+
+        Args:
+            text: Research text to analyze
+
+        Returns:
+            Dictionary containing results from all three agents
+        """
+        return self._run_sync(self.analyze(text))
+
+    def cache_clear(self) -> None:
+        """Forget all cached analyses and agent responses, including on disk."""
+        self._cache.clear()
+        self.response_cache.clear()
+        if self.disk_cache is not None:
+            self.disk_cache.clear()
+
+    async def _embed(self, text: str) -> list[float]:
+        """Embed an agent input for semantic cache lookups."""
+        result = await self.client.aio.models.embed_content(
+            model=EMBEDDING_MODEL,
+            contents=text,
+            config=types.EmbedContentConfig(task_type="SEMANTIC_SIMILARITY"),
+        )
+        return result.embeddings[0].values
+    
+    def _research_summary(self, research_json: str) -> str:
+        """
+        Condense the research structure into the downstream agents' input.
+
+        Fields become one labelled line each and unspecified ones are
+        dropped, so the downstream agents are not billed for JSON syntax and
+        placeholders. Output that is not a JSON object is passed on as-is.
+        """
+        try:
+            parsed = orjson.loads(_strip_fences(research_json))
+        except orjson.JSONDecodeError:
+            return research_json
+        if not isinstance(parsed, dict):
+            return research_json
+
+        lines = []
+        for key, label in SUMMARY_LABELS:
+            value = parsed.get(key)
+            if isinstance(value, list):
+                value = "; ".join(str(item) for item in value)
+            if value and value != NOT_SPECIFIED:
+                lines.append(f"{label}: {value}")
+        return "\n".join(lines) or research_json
+
+    async def _analyze_downstream(
+        self, research_summary: str
+    ) -> tuple[dict, dict, bool]:
+        """
+        Run downstream agents concurrently using the research summary.
+
+        Returns:
+            Validity threats, literature scout and whether either agent failed
+        """
+        validity_response, literature_response = await asyncio.gather(
+            _get_response(self.validity_agent, research_summary),
+            _get_response(self.literature_agent, research_summary),
+            return_exceptions=True,
+        )
+        return self._downstream_results(validity_response, literature_response)
+
+    def _downstream_results(
+        self,
+        validity_response: "Optional[str] | BaseException",
+        literature_response: "Optional[str] | BaseException",
+    ) -> tuple[dict, dict, bool]:
+        """
+        Turn the downstream agents' responses, or the errors they raised,
+        into results, parsing each response exactly once. A None response
+        (from a skipped agent) gives empty results.
+
+        Returns:
+            Validity threats, literature scout and whether either agent failed
+            or returned a response that does not parse
+        """
+        failed = False
+
+        if isinstance(validity_response, BaseException):
+            logger.warning("Error in validity_threats: %r", validity_response)
+            error = str(validity_response) or type(validity_response).__name__
+            validity_threats = self._default_validity_threats(error=f"Error: {error}")
+            failed = True
+        elif validity_response is None:
+            validity_threats = self._default_validity_threats()
+        else:
+            validity_threats, parsed = self._parse_validity_threats(validity_response)
+            failed = failed or not parsed
+
+        if isinstance(literature_response, BaseException):
+            logger.warning("Error in literature_scout: %r", literature_response)
+            error = str(literature_response) or type(literature_response).__name__
+            literature_scout = self._default_literature_scout(error=f"Error: {error}")
+            failed = True
+        elif literature_response is None:
+            literature_scout = self._default_literature_scout()
+        else:
+            literature_scout, parsed = self._parse_literature_scout(literature_response)
+            failed = failed or not parsed
+
+        return validity_threats, literature_scout, failed
+    
+    def _parse_research_structure(self, response: str) -> tuple[dict, bool]:
+        try:
+            parsed = orjson.loads(_strip_fences(response))
         except Exception as e:
             return self._default_research_structure(
                 error=f"Failed to parse research structure: {str(e)}"
-            )
+            ), False
+        if not isinstance(parsed, dict):
+            return self._default_research_structure(
+                error="Failed to parse research structure: JSON is not an object"
+            ), False
+        return self._build_research_structure(parsed), True
 
-    def _parse_validity_threats(self, response: str) -> dict:
+    def _parse_validity_threats(self, response: str) -> tuple[dict, bool]:
         try:
-            parsed = json.loads(response)
-            if isinstance(parsed, dict):
-                return self._merge_defaults(self._default_validity_threats(), parsed)
-            return self._default_validity_threats(
-                error="Failed to parse validity threats: JSON is not an object"
-            )
+            parsed = orjson.loads(_strip_fences(response))
         except Exception as e:
             return self._default_validity_threats(
                 error=f"Failed to parse validity threats: {str(e)}"
-            )
+            ), False
+        if not isinstance(parsed, dict):
+            return self._default_validity_threats(
+                error="Failed to parse validity threats: JSON is not an object"
+            ), False
+        return self._build_validity_threats(parsed), True
 
-    def _parse_literature_scout(self, response: str) -> dict:
+    def _parse_literature_scout(self, response: str) -> tuple[dict, bool]:
         try:
-            parsed = json.loads(response)
-            if isinstance(parsed, dict):
-                return self._merge_defaults(self._default_literature_scout(), parsed)
-            return self._default_literature_scout(
-                error="Failed to parse literature scout: JSON is not an object"
-            )
+            parsed = orjson.loads(_strip_fences(response))
         except Exception as e:
             return self._default_literature_scout(
                 error=f"Failed to parse literature scout: {str(e)}"
-            )
+            ), False
+        if not isinstance(parsed, dict):
+            return self._default_literature_scout(
+                error="Failed to parse literature scout: JSON is not an object"
+            ), False
+        return self._build_literature_scout(parsed), True
     
-    def analyze_and_print(self, text: str, parallel: bool = True) -> dict:
+    def _parse_fused_analysis(self, response: str) -> tuple[dict, bool]:
+        """
+        Parse the fused agent's response.
+
+        Like the other _parse_* methods, returns the result and whether the
+        response parsed; on failure the result carries the error.
+        """
+        try:
+            parsed = orjson.loads(_strip_fences(response))
+        except Exception as e:
+            return (
+                self._default_analysis(error=f"Failed to parse analysis: {str(e)}"),
+                False,
+            )
+        if not isinstance(parsed, dict):
+            return self._default_analysis(
+                error="Failed to parse analysis: JSON is not an object"
+            ), False
+
+        def section(name: str) -> dict:
+            value = parsed.get(name)
+            return value if isinstance(value, dict) else {}
+
+        return {
+            "research_structure": self._build_research_structure(
+                section("research_structure")
+            ),
+            "validity_threats": self._build_validity_threats(
+                section("validity_threats")
+            ),
+            "literature_scout": self._build_literature_scout(
+                section("literature_scout")
+            ),
+        }, True
+
+    def analyze_and_print(self, text: str) -> dict:
         """
         Analyze research text and print formatted results.
+
+        Blocks like analyze_sync(), so it must not be called from async code.
         
         Args:
             text: Research text to analyze
-            parallel: If True, run agents in parallel
             
         Returns:
             Dictionary containing all results
         """
         print("🔍 Starting Research Analysis...\n")
-        
-        results = self.analyze(text, parallel=parallel)
-        
-        # Print Research Structure
-        print("=" * 80)
-        print("📋 RESEARCH STRUCTURE")
-        print("=" * 80)
-        research_structure = results["research_structure"]
-        print(f"Research Question: {research_structure.get('research_question')}")
-        print(f"Hypothesis: {research_structure.get('hypothesis')}")
-        print(f"Method: {research_structure.get('method')}")
-        variables = research_structure.get("variables") or []
-        print(
-            f"Variables: {', '.join(variables) if variables else 'None specified'}"
-        )
-        print(f"Dataset: {research_structure.get('dataset')}")
-        print(f"Evaluation: {research_structure.get('evaluation')}")
-        if research_structure.get("missing_elements"):
-            print("\n⚠️  Missing Elements:")
-            for elem in research_structure.get("missing_elements", []):
-                print(f"  • {elem}")
-        
-        # Print Validity Threats
-        print("\n" + "=" * 80)
-        print("⚠️  VALIDITY THREATS")
-        print("=" * 80)
-        
-        validity_threats = results["validity_threats"]
-        if validity_threats.get("internal_validity"):
-            print("\n🔴 Internal Validity:")
-            for threat in validity_threats.get("internal_validity", []):
-                print(f"  • {threat}")
-        
-        if validity_threats.get("external_validity"):
-            print("\n🟠 External Validity:")
-            for threat in validity_threats.get("external_validity", []):
-                print(f"  • {threat}")
-        
-        if validity_threats.get("construct_validity"):
-            print("\n🟡 Construct Validity:")
-            for threat in validity_threats.get("construct_validity", []):
-                print(f"  • {threat}")
-        
-        if validity_threats.get("conclusion_validity"):
-            print("\n🟢 Conclusion Validity:")
-            for threat in validity_threats.get("conclusion_validity", []):
-                print(f"  • {threat}")
-        
-        if validity_threats.get("mitigation_suggestions"):
-            print("\n💡 Mitigation Suggestions:")
-            for suggestion in validity_threats.get("mitigation_suggestions", []):
-                print(f"  • {suggestion}")
-        
-        # Print Literature Scout
-        print("\n" + "=" * 80)
-        print("📚 LITERATURE SCOUT")
-        print("=" * 80)
-        
-        literature_scout = results["literature_scout"]
-        if literature_scout.get("inferred_topics"):
-            print("\n🎯 Inferred Topics:")
-            for topic in literature_scout.get("inferred_topics", []):
-                print(f"  • {topic}")
-        
-        if literature_scout.get("search_queries"):
-            print("\n🔎 Search Queries:")
-            for query in literature_scout.get("search_queries", []):
-                print(f"  • {query}")
-        
-        if literature_scout.get("example_related_work"):
-            print("\n📄 Example Related Work:")
-            for work in literature_scout.get("example_related_work", []):
-                print(f"  • {work}")
-        
-        print("\n" + "=" * 80)
-        print("✅ Analysis Complete!")
-        print("=" * 80)
-        
+        return self._run_sync(self._print_stream(text))
+
+    async def _print_stream(self, text: str) -> dict:
+        """Print each report section as soon as analyze_stream() yields it."""
+        results = {}
+        async for name, section in self.analyze_stream(text):
+            results[name] = section
+            sys.stdout.write(self.format_section(name, section))
+            sys.stdout.flush()
+        sys.stdout.write(REPORT_FOOTER)
         return results
 
-    def _default_research_structure(self, error: Optional[str] = None) -> dict:
-        base = {
-            "research_question": "Not specified",
-            "hypothesis": "Not specified",
-            "method": "Not specified",
-            "variables": [],
-            "dataset": "Not specified",
-            "evaluation": "Not specified"
+    def format_section(self, name: str, section: dict) -> str:
+        """
+        Render one result section as it appears in the report.
+
+        Args:
+            name: Section name, one of SECTIONS
+            section: The section's result
+
+        Returns:
+            The formatted section
+        """
+        if name == "research_structure":
+            variables = section.get("variables") or []
+            lines = [
+                RULE,
+                "📋 RESEARCH STRUCTURE",
+                RULE,
+                f"Research Question: {section.get('research_question')}",
+                f"Hypothesis: {section.get('hypothesis')}",
+                f"Method: {section.get('method')}",
+                f"Variables: {', '.join(variables) if variables else 'None specified'}",
+                f"Dataset: {section.get('dataset')}",
+                f"Evaluation: {section.get('evaluation')}",
+            ]
+            _append_list_sections(
+                lines, section, (("missing_elements", "⚠️  Missing Elements"),)
+            )
+        elif name == "validity_threats":
+            lines = ["", RULE, "⚠️  VALIDITY THREATS", RULE]
+            _append_list_sections(lines, section, VALIDITY_SECTIONS)
+        else:
+            lines = ["", RULE, "📚 LITERATURE SCOUT", RULE]
+            _append_list_sections(lines, section, LITERATURE_SECTIONS)
+        lines.append("")
+        return "\n".join(lines)
+
+    # The _build_* helpers read only the known keys of a parsed agent response,
+    # filling in defaults, so each result is a single fresh dict.
+
+    def _build_research_structure(self, parsed: dict) -> dict:
+        get = parsed.get
+        return {
+            "research_question": get("research_question", NOT_SPECIFIED),
+            "hypothesis": get("hypothesis", NOT_SPECIFIED),
+            "method": get("method", NOT_SPECIFIED),
+            "variables": get("variables", []),
+            "dataset": get("dataset", NOT_SPECIFIED),
+            "evaluation": get("evaluation", NOT_SPECIFIED),
         }
-        if error:
-            base["missing_elements"].append(error)
+
+    def _build_validity_threats(self, parsed: dict) -> dict:
+        get = parsed.get
+        return {
+            "internal_validity": get("internal_validity", []),
+            "external_validity": get("external_validity", []),
+            "construct_validity": get("construct_validity", []),
+            "conclusion_validity": get("conclusion_validity", []),
+            "mitigation_suggestions": get("mitigation_suggestions", []),
+        }
+
+    def _build_literature_scout(self, parsed: dict) -> dict:
+        get = parsed.get
+        return {
+            "inferred_topics": get("inferred_topics", []),
+            "search_queries": get("search_queries", []),
+            "example_related_work": get("example_related_work", []),
+        }
+
+    def _default_analysis(self, error: str) -> dict:
+        return {
+            "research_structure": self._default_research_structure(error=error),
+            "validity_threats": self._default_validity_threats(),
+            "literature_scout": self._default_literature_scout(),
+        }
+
+    def _default_research_structure(self, error: Optional[str] = None) -> dict:
+        base = self._build_research_structure({})
+        if error is not None:
+            base["missing_elements"] = [error]
         return base
 
     def _default_validity_threats(self, error: Optional[str] = None) -> dict:
-        base = {
-            "internal_validity": [],
-            "external_validity": [],
-            "construct_validity": [],
-            "conclusion_validity": [],
-            "mitigation_suggestions": [],
-        }
-        if error:
+        base = self._build_validity_threats({})
+        if error is not None:
             base["mitigation_suggestions"].append(error)
         return base
 
     def _default_literature_scout(self, error: Optional[str] = None) -> dict:
-        base = {
-            "example_related_work": [],
-        }
-        if error:
+        base = self._build_literature_scout({})
+        if error is not None:
             base["inferred_topics"].append(error)
         return base
-
-    def _merge_defaults(self, defaults: dict, parsed: dict) -> dict:
-        merged = defaults.copy()
-        for key, value in parsed.items():
-            if key in merged:
-                merged[key] = value
-        return merged
@@ -1,35 +1,21 @@
 """Research Structure Agent for extracting research components."""
 
+from typing import Optional
+
 from google import genai
-from google.genai import types
 
+from cache import SemanticCache
+from gemini_agent import GeminiAgent, RateLimiter
+from llm_cache import LLMCache
+from schemas import ResearchStructureOutput
 
-class ResearchStructureAgent:
-    """Agent to extract research structure and identify missing components."""
-    
-    def __init__(self, api_key: str, model: str = "gemini-2.5-flash"):
-        """
-        Initialize the Research Structure Agent.
-        
-        Args:
-            api_key: Google API key for Gemini
-            model: Gemini model to use
-        """
-        self.client = genai.Client(api_key=api_key)
-        self.model = model
+# Upper bound on generated tokens (including thinking) per response
+MAX_OUTPUT_TOKENS = 2048
 
-    def get_response(self, research_text: str) -> str:
-        """
-        Generate a response from the LLM.
-
-        Args:
-            research_text (str): The input.
+# Extraction into a fixed schema does not benefit from thinking tokens
+THINKING_BUDGET = 0
 
-        Returns:
-            str: Generated response from the LLM.
-        """
-        # System instructions
-        sys_instructions = f"""You are an expert research analyst. Analyze the given text and extract:
+SYS_INSTRUCTIONS = """You are an expert research analyst. Analyze the given text and extract:
 - Research question
 - Hypothesis
 - Research methodology
@@ -39,31 +25,49 @@ class ResearchStructureAgent:
 
 Identify any missing components that would make the research more complete.
 
-You MUST respond with ONLY a valid JSON object in this exact format:
-{{
-  "research_question": "extracted or 'Not specified'",
-  "hypothesis": "extracted or 'Not specified'",
-  "method": "extracted methodology or 'Not specified'",
-  "variables": ["list", "of", "variables"],
-  "dataset": "dataset description or 'Not specified'",
-  "evaluation": "evaluation metrics or 'Not specified'"
-}}
-
-Do not include any text before or after the JSON. Avoid any markdown formatting.
-        """
+Use "Not specified" for any component the text does not state.
+"""
 
-        # Generate a response from the llm
-        response = self.client.models.generate_content(
-            model=self.model,
-            contents=research_text,
-            config=types.GenerateContentConfig(
-                temperature=0.0,
-                system_instruction=sys_instructions
-            )
-        )
-        response = response.text
 
-        return response
+class ResearchStructureAgent(GeminiAgent):
+    """Agent to extract research structure and identify missing components."""
+    
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        model: str = "gemini-2.5-flash",
+        client: Optional[genai.Client] = None,
+        response_cache: Optional[SemanticCache] = None,
+        disk_cache: Optional[LLMCache] = None,
+        rate_limiter: Optional[RateLimiter] = None,
+        thinking_budget: Optional[int] = THINKING_BUDGET,
+    ):
+        """
+        Initialize the Research Structure Agent.
+        
+        Args:
+            api_key: Google API key for Gemini
+            model: Gemini model to use
+            client: Gemini client to use. If None, agents share one client
+                per API key and event loop
+            response_cache: Cache of previous responses to serve repeats from
+            disk_cache: Persistent cache of previous responses
+            rate_limiter: Limiter shared with the other agents
+            thinking_budget: Cap on thinking tokens, or None for the model's
+                default
+        """
+        super().__init__(
+            SYS_INSTRUCTIONS,
+            ResearchStructureOutput,
+            api_key,
+            model,
+            client,
+            max_output_tokens=MAX_OUTPUT_TOKENS,
+            thinking_budget=thinking_budget,
+            response_cache=response_cache,
+            disk_cache=disk_cache,
+            rate_limiter=rate_limiter,
+        )
     
 
 # if __name__ == "__main__":
@@ -0,0 +1,57 @@
+"""Pydantic models for the research analysis API."""
+
+from pydantic import BaseModel, ConfigDict, Field
+
+
+class AnalysisRequest(BaseModel):
+    """Body of a POST /analyze request."""
+
+    model_config = ConfigDict(extra="ignore")
+
+    text: str = Field(..., min_length=1, pattern=r"\S")
+
+
+# Response schemas enforced on the agents through Gemini structured output.
+
+
+class ResearchStructureOutput(BaseModel):
+    """Research components extracted by the research structure agent."""
+
+    research_question: str
+    hypothesis: str
+    method: str
+    variables: list[str]
+    dataset: str
+    evaluation: str
+
+
+class ValidityThreatOutput(BaseModel):
+    """Validity threats and mitigations found by the validity threat agent."""
+
+    internal_validity: list[str]
+    external_validity: list[str]
+    construct_validity: list[str]
+    conclusion_validity: list[str]
+    mitigation_suggestions: list[str]
+
+
+class LiteratureScoutOutput(BaseModel):
+    """Related-research pointers from the literature scout agent."""
+
+    inferred_topics: list[str]
+    search_queries: list[str]
+    example_related_work: list[str]
+
+
+class RelatedWorkOutput(BaseModel):
+    """Literature scout output in titles-only mode."""
+
+    example_related_work: list[str]
+
+
+class AnalysisOutput(BaseModel):
+    """Combined output of the fused analysis agent."""
+
+    research_structure: ResearchStructureOutput
+    validity_threats: ValidityThreatOutput
+    literature_scout: LiteratureScoutOutput
@@ -0,0 +1,56 @@
+"""Tests for the semantic response cache."""
+
+import asyncio
+import unittest
+
+from cache import SemanticCache
+
+
+async def embed(text: str) -> list[float]:
+    await asyncio.sleep(0)
+    return [1.0, 0.0] if text.startswith("x") else [0.0, 1.0]
+
+
+class SemanticCacheTest(unittest.IsolatedAsyncioTestCase):
+    async def test_exact_hit(self):
+        cache = SemanticCache()
+        await cache.put("ns", "text", "response")
+        self.assertEqual(await cache.get("ns", "text"), "response")
+        self.assertIsNone(await cache.get("other", "text"))
+
+    async def test_semantic_hit(self):
+        cache = SemanticCache(embed=embed, threshold=0.9)
+        await cache.put("ns", "x1", "response")
+        self.assertEqual(await cache.get("ns", "x2"), "response")
+        self.assertIsNone(await cache.get("ns", "y"))
+
+    async def test_concurrent_puts_of_same_text(self):
+        cache = SemanticCache(embed=embed, threshold=0.9, max_entries=1)
+        await asyncio.gather(
+            cache.put("ns", "x1", "first"), cache.put("ns", "x1", "second")
+        )
+        ns = cache._namespaces["ns"]
+        self.assertEqual(len(ns.keys), len(ns.exact))
+        self.assertEqual(ns.matrix.shape[0], len(ns.keys))
+
+        # Evicts x1; a lookup similar to it must miss rather than fail
+        await cache.put("ns", "y", "other")
+        self.assertIsNone(await cache.get("ns", "x2"))
+
+    async def test_save_and_load(self):
+        import os
+        import tempfile
+
+        cache = SemanticCache(embed=embed, threshold=0.9)
+        await cache.put("ns", "x1", "response")
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "cache.npz")
+            cache.save(path)
+            loaded = SemanticCache(embed=embed, threshold=0.9)
+            loaded.load(path)
+        self.assertEqual(await loaded.get("ns", "x1"), "response")
+        self.assertEqual(await loaded.get("ns", "x2"), "response")
+
+
+if __name__ == "__main__":
+    unittest.main()